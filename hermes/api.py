@@ -11,7 +11,7 @@ from .utils import convert
 
 
 class GazelleAPI(object):
-    def __init__(self, site_url, api_id, api_key, cache):
+    def __init__(self, site_url, api_id, api_key, cache, timeout=10):
         self.site_url = site_url
         self.api_id = api_id
         self.api_key = api_key
@@ -20,6 +20,9 @@ class GazelleAPI(object):
             'api.php?aid={}&token={}'.format(api_id, api_key)
         )
         self.cache = cache
+        # Seconds to wait on the site, so that a hung site fails the request (and the
+        # API poll) instead of blocking the caller forever
+        self.timeout = timeout
 
     def get_user(self, user):
         try:
@@ -27,12 +30,12 @@ class GazelleAPI(object):
                 r = requests.get(self.api_url, {
                     "action": "user",
                     "user_id": user
-                })
+                }, timeout=self.timeout)
             else:
                 r = requests.get(self.api_url, {
                     "action": "user",
                     "username": user
-                })
+                }, timeout=self.timeout)
 
             if r.status_code == requests.codes.ok:
                 response = r.json()
@@ -49,7 +52,7 @@ class GazelleAPI(object):
             r = requests.get(self.api_url, {
                 "action": "forum",
                 "topic_id": topic_id
-            })
+            }, timeout=self.timeout)
             if r.status_code == requests.codes.ok:
                 response = r.json()
                 return convert(response['response']) if response['status'] == 200 else None
@@ -63,7 +66,7 @@ class GazelleAPI(object):
             r = requests.get(self.api_url, {
                 "action": "wiki",
                 "wiki_id": wiki_id
-            })
+            }, timeout=self.timeout)
             if r.status_code == requests.codes.ok:
                 response = r.json()
                 return convert(response['response']) if response['status'] == 200 else None
@@ -77,7 +80,7 @@ class GazelleAPI(object):
             r = requests.get(self.api_url, {
                 "action": "request",
                 "request_id": request_id
-            })
+            }, timeout=self.timeout)
             if r.status_code == requests.codes.ok:
                 response = r.json()
                 return convert(response['response']) if response['status'] == 200 else None
@@ -92,7 +95,7 @@ class GazelleAPI(object):
                 "action": "torrent",
                 "req": "torrent",
                 "torrent_id": torrent_id
-            })
+            }, timeout=self.timeout)
             if r.status_code == requests.codes.ok:
                 response = r.json()
                 return convert(response['response']) if response['status'] == 200 else None
@@ -107,7 +110,7 @@ class GazelleAPI(object):
                 "action": "torrent",
                 "req": "group",
                 "group_id": group_id
-            })
+            }, timeout=self.timeout)
             if r.status_code == requests.codes.ok:
                 response = r.json()
                 return convert(response['response']) if response['status'] == 200 else None
@@ -121,7 +124,7 @@ class GazelleAPI(object):
             r = requests.get(self.api_url, {
                 "action": "artist",
                 "artist_id": artist_id
-            })
+            }, timeout=self.timeout)
             if r.status_code == requests.codes.ok:
                 response = r.json()
                 return convert(response['response']) if response['status'] == 200 else None
@@ -135,7 +138,7 @@ class GazelleAPI(object):
             r = requests.get(self.api_url, {
                 "action": "collage",
                 "collage_id": collage_id
-            })
+            }, timeout=self.timeout)
             if r.status_code == requests.codes.ok:
                 response = r.json()
                 return convert(response['response']) if response['status'] == 200 else None
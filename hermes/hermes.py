@@ -6,11 +6,15 @@ also contains some utility functions that are used within the bot, those these
 functions may be moved elsewhere as appopriate.
 """
 import argparse
+import collections
+import functools
+import heapq
+import itertools
 import locale
 import logging
 import os
 import random
-import re
+import selectors
 import signal
 import socket
 import ssl
@@ -24,7 +28,7 @@ from irc.connection import Factory
 from .api import GazelleAPI
 from .database import GazelleDB
 from .irc import IRCBot
-from .loader import load_modules
+from .loader import load_modules, load_module, LazyModule, LazyCallable
 from .utils import get_git_hash, check_pid, load_config, DotDict
 from .cache import Cache
 from .persist import PersistentStorage
@@ -63,11 +67,12 @@ class Hermes(IRCBot):
             os.makedirs(HERMES_DIR, exist_ok=True)
         self.config = load_config(os.path.join(HERMES_DIR, "config.yml"))
         self.logger.info("-> Loaded Config")
+        self._admins = set(self.config.admins or [])
         self.nick = self.config.nick
         self.name = self.config.name if 'name' in self.config else self.nick
 
         self.logger.info("-> Loading Modules")
-        self.modules = load_modules()
+        self.modules = load_modules(lazy=True)
         self.logger.info("-> Modules Loaded")
 
         if 'persist' in self.config and 'path' in self.config.persist:
@@ -91,7 +96,8 @@ class Hermes(IRCBot):
         if 'socket' in self.config:
             self.listener = Listener(
                 self.config['socket']['host'],
-                self.config['socket']['port']
+                self.config['socket']['port'],
+                self.config['socket'].get('reuse_port') is True
             )
 
         if 'database' in self.config:
@@ -106,22 +112,24 @@ class Hermes(IRCBot):
                 self.config.site.url,
                 self.config.api.id,
                 self.config.api.key,
-                self.cache
+                self.cache,
+                self.config.api.get('timeout', 10)
             )
 
         self.logger.info("-> Loaded DB")
 
         for name, mod in self.modules.items():
-            # noinspection PyBroadException
-            try:
-                if hasattr(mod, 'setup'):
-                    mod.setup(self)
-                self.logger.info("Loaded module: {}".format(name))
-            except BaseException:
-                self.logger.exception("Error Module: {}".format(name))
+            if isinstance(mod, LazyModule):
+                self.logger.info("Deferred module: {}".format(name))
+            else:
+                self._setup_module(name, mod)
+        self.build_dispatch_table()
 
         if 'ssl' in self.config.irc and self.config.irc.ssl is True:
-            factory = Factory(wrapper=ssl.wrap_socket)
+            context = get_ssl_context(self.config.irc.ssl_verify is True)
+            factory = Factory(wrapper=functools.partial(
+                context.wrap_socket, server_hostname=self.config.irc.host
+            ))
         else:
             factory = Factory()
 
@@ -134,7 +142,7 @@ class Hermes(IRCBot):
 
         self.api_poll_heartbeat = self.config.polling.heartbeat
         self.api_poll_threshold = self.config.polling.threshold
-        self.api_poll_results = []
+        self.api_poll_results = collections.deque(maxlen=self.api_poll_threshold)
         self.api_poll_messaged = False
 
     def set_nick(self, connection):
@@ -194,31 +202,103 @@ class Hermes(IRCBot):
             self.listener.start()
         if hasattr(self.config.irc, "channels") and \
                 isinstance(self.config.irc.channels, dict):
-            for name in self.config.irc.channels:
-                self.logger.info("-> Entering {}".format(name))
-                connection.send_raw("SAJOIN {} #{}".format(self.nick, name))
+            channels = ["#{}".format(name) for name in self.config.irc.channels]
+            # Join as many channels per SAJOIN as fit on a line, unless the ircd
+            # cannot handle a channel list
+            if self.config.irc.sajoin_batch is False:
+                batches = channels
+            else:
+                command = "SAJOIN {} ".format(self.nick)
+                batches = batch_join(channels, 500 - len(command))
+            for batch in batches:
+                self.logger.info("-> Entering {}".format(batch))
+                connection.send_raw("SAJOIN {} {}".format(self.nick, batch))
 
     def on_disconnect(self, connection, event):
         self.logger.info("-> Disconnected from IRC")
 
-    def _execute_function(self, func, connection, event):
-        cmd = event.cmd
-        if hasattr(func, "commands"):
-            for command in func.commands:
-                if cmd == "." + command or cmd == "!" + command or \
-                        (event.type == "privmsg" and cmd == command):
-                    func(self, connection, event)
-        if hasattr(func, "rules"):
-            for rule in func.rules:
-                match = re.search(rule, event.msg)
-                if match:
-                    func(self, connection, event, match)
+    def _setup_module(self, name, mod):
+        # noinspection PyBroadException
+        try:
+            if hasattr(mod, 'setup'):
+                mod.setup(self)
+            self.logger.info("Loaded module: {}".format(name))
+        except BaseException:
+            self.logger.exception("Error Module: {}".format(name))
+
+    def _load_lazy_function(self, name, func):
+        """
+        Modules are only imported (and setup) the first time one of their callables is
+        run, until then the dispatch table holds LazyCallable stand-ins. Swaps the
+        module in and returns the real function, or None if the module failed to import.
+        """
+        mod = self.modules.get(name)
+        if isinstance(mod, LazyModule):
+            # noinspection PyBroadException
+            try:
+                load_module(self.modules, mod.__mod_path__)
+            except BaseException:
+                self.logger.exception("Error Module: {}".format(name))
+                del self.modules[name]
+                self.build_dispatch_table()
+                return None
+            mod = self.modules[name]
+            self._setup_module(name, mod)
+            self.build_dispatch_table()
+        elif mod is None:
+            return None
+        return getattr(mod, func.__name__, None)
+
+    def build_dispatch_table(self):
+        """
+        Index the callables of all loaded modules so that a message only has to look at
+        the functions registered for its command instead of scanning every module.
+        Commands are keyed without their prefix. This needs to be re-run whenever
+        self.modules changes (e.g. on module reload).
+        """
+        commands = {}
+        rules = []
+        for name, mod in self.modules.items():
+            for func in mod.__callables__:
+                for command in func.commands:
+                    commands.setdefault(command, []).append((name, func))
+                if func.rules:
+                    rules.append((name, func))
+        self._cmd_table = commands
+        self._rule_table = rules
+
+    def _execute_function(self, name, func, connection, event, *args):
+        if event.args is None:
+            event.args = event.msg.split()[1:]
+        # noinspection PyBroadException
+        try:
+            func(self, connection, event, *args)
+        except BaseException:
+            if event.type == "privmsg":
+                msg = "I'm sorry, {}.{} threw an exception.".format(
+                    name,
+                    func.__name__
+                )
+                msg += " Please tell an administrator and try again later."
+                connection.privmsg(event.source.nick, msg)
+            self.logger.exception(
+                "Failed to run function: {}.{}".format(name, func.__name__)
+            )
 
     def check_admin(self, event):
-        return event.source.nick in self.config.admins \
-            and event.source.host is not None \
-            and event.source.host.endswith(self.config.site.tld) \
-            and event.source.host.split(",")[0] not in self.config.admins
+        """
+        Check if the sender of the event is an admin, the result is cached on the event
+        as every callable that is admin only would otherwise have to redo the check.
+        """
+        is_admin = getattr(event, "_is_admin", None)
+        if is_admin is None:
+            host = event.source.host
+            is_admin = event.source.nick in self._admins \
+                and host is not None \
+                and host.endswith(self.config.site.tld) \
+                and host.split(",", 1)[0] not in self._admins
+            event._is_admin = is_admin
+        return is_admin
 
     def _dispatch(self, connection, event):
         """
@@ -234,33 +314,47 @@ class Hermes(IRCBot):
                         was sent)
             tags (empty list)
         """
-        event.msg = event.arguments[0]
-        args = event.arguments[0].split()
+        event.msg = msg = event.arguments[0]
+        args = msg.split(None, 1)
         if len(args) == 0:
             return
-        event.cmd = args[0].lower()
-        event.args = args[1:] if len(args) > 1 else []
-        for name, mod in self.modules.items():
-            for func in mod.__callables__:
-                if func.disabled is True:
+        event.cmd = cmd = args[0].lower()
+        # Most messages do not run anything, so only split out the arguments once a
+        # function is actually executed for it (see _execute_function)
+        event.args = None
+        # This runs for every message, so bind everything used in the loops to locals
+        etype = event.type
+        check_admin = self.check_admin
+        execute = self._execute_function
+        # Commands need a prefix, except in private messages where it is optional
+        if cmd.startswith((".", "!")):
+            handlers = self._cmd_table.get(cmd[1:], [])
+        elif etype == "privmsg":
+            handlers = self._cmd_table.get(cmd, [])
+        else:
+            handlers = []
+        for name, func in handlers:
+            if func.disabled or etype not in func.events \
+                    or (func.admin_only and not check_admin(event)):
+                continue
+            if isinstance(func, LazyCallable):
+                func = self._load_lazy_function(name, func)
+                if func is None:
                     continue
-                elif func.admin_only is True and not self.check_admin(event):
+            execute(name, func, connection, event)
+        for name, func in self._rule_table:
+            if func.disabled or etype not in func.events \
+                    or (func.admin_only and not check_admin(event)):
+                continue
+            for rule in func.rules:
+                match = rule.search(msg)
+                if not match:
                     continue
-                # noinspection PyBroadException
-                try:
-                    if event.type in func.events:
-                        self._execute_function(func, connection, event)
-                except BaseException:
-                    if event.type == "privmsg":
-                        msg = "I'm sorry, {}.{} threw an exception.".format(
-                            name,
-                            func.__name__
-                        )
-                        msg += " Please tell an administrator and try again later."
-                        connection.privmsg(event.source.nick, msg)
-                    self.logger.exception(
-                        "Failed to run function: {}.{}".format(name, func.__name__)
-                    )
+                if isinstance(func, LazyCallable):
+                    func = self._load_lazy_function(name, func)
+                    if func is None:
+                        break
+                execute(name, func, connection, event, match)
 
     def disconnect(self, msg="I'll be back!"):
         if self.database is not None:
@@ -278,66 +372,91 @@ class RestartException(Exception):
     pass
 
 
-class BotCheck(threading.Thread):
-    def __init__(self, bot):
-        super().__init__()
-        self.alive = True
-        self.bot = bot
-
-    def run(self):
-        time.sleep(120)
-        while self.alive:
-            if len(self.bot.channels) == 0:
-                self.bot.logger.info('-> Bot not connected to channels, restarting')
-                self.bot.restart()
-                time.sleep(5)
-
-    def stop(self):
-        self.alive = False
-        self.join()
-
-
-class SaveData(threading.Thread):
-    def __init__(self, bot):
-        super().__init__()
-        self.alive = True
-        self.bot = bot
+class Scheduler(threading.Thread):
+    """
+    Runs the periodic background tasks of the bot (saving data, polling the API, ...)
+    from a single thread, which sleeps until the next task is due. A task that blocks
+    holds up the others, so anything doing IO needs a bounded timeout (the API poll
+    relies on GazelleAPI's request timeout).
+    """
+    def __init__(self):
+        super().__init__(daemon=True)
         self.logger = LOGGER
+        self._tasks = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
 
-    def run(self):
-        cycle = 480
-        while self.alive:
-            if cycle >= 600:
-                self.logger.info('saving data')
-                self.bot.storage.save()
-                cycle = 0
-            cycle += 1
-            time.sleep(1)
-
-    def stop(self):
-        self.alive = False
-        self.join()
-
-class PollApi(threading.Thread):
-    def __init__(self, bot):
-        super().__init__()
-        self.bot = bot
+    def execute_every(self, interval, func, delay=None):
+        """
+        Run func every interval seconds, the first time after delay seconds (defaults to
+        interval).
+        """
+        due = time.monotonic() + (interval if delay is None else delay)
+        with self._lock:
+            heapq.heappush(self._tasks, (due, next(self._counter), interval, func))
+        self._wakeup.set()
 
     def run(self):
         while True:
-            result = False
-            user = self.bot.database.get_user(1)
-            if user == None:
-                result = True
-            if len(self.bot.api_poll_results) < self.bot.api_poll_threshold:
-                self.bot.api_poll_results = self.bot.api_poll_results + [result]
-            else:
-                self.bot.api_poll_results = self.bot.api_poll_results[1:] + [result]
-            if all(self.bot.api_poll_results) and not self.bot.api_poll_messaged:
-                for admin in self.bot.config.admins:
-                    self.bot.connection.privmsg(admin, "Bad polls exceeded threshold. Is the site down?")
-                self.bot.api_poll_messaged = True
-            time.sleep(self.api_poll_heartbeat)
+            with self._lock:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                if len(self._tasks) == 0 or self._tasks[0][0] > now:
+                    timeout = self._tasks[0][0] - now if self._tasks else None
+                    task = None
+                else:
+                    task = heapq.heappop(self._tasks)
+            if task is None:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                continue
+            due, count, interval, func = task
+            # noinspection PyBroadException
+            try:
+                func()
+            except BaseException:
+                self.logger.exception("Failed to run task: {}".format(func))
+            # Skip runs that were missed rather than running them back to back
+            due = max(due + interval, time.monotonic())
+            with self._lock:
+                heapq.heappush(self._tasks, (due, count, interval, func))
+
+    def stop(self, timeout=None):
+        with self._lock:
+            self._stopped = True
+        self._wakeup.set()
+        self.join(timeout)
+
+
+def check_channels(bot):
+    if len(bot.channels) == 0:
+        bot.logger.info('-> Bot not connected to channels, restarting')
+        bot.restart()
+
+
+def save_data(bot):
+    bot.logger.info('saving data')
+    bot.storage.save()
+
+
+def poll_api(bot):
+    if bot.database is None:
+        return
+    result = False
+    user = bot.database.get_user(1)
+    if user == None:
+        result = True
+    bot.api_poll_results.append(result)
+    if all(bot.api_poll_results) and not bot.api_poll_messaged:
+        for admin in bot.config.admins:
+            bot.connection.privmsg(
+                admin, "Bad polls exceeded threshold. Is the site down?"
+            )
+        bot.api_poll_messaged = True
+
 
 class Listener(threading.Thread):
     """
@@ -345,13 +464,14 @@ class Listener(threading.Thread):
     like new torrents (via announce) or reports/errors that the bot would then properly
     relay into the appropriate IRC channels.
     """
-    def __init__(self, host, port):
+    def __init__(self, host, port, reuse_port=False):
         self.logger = LOGGER
         self.running = True
         self.restart = False
         self.connection = None
         self.host = host
         self.port = port
+        self.reuse_port = reuse_port
         threading.Thread.__init__(self)
 
     def set_connection(self, connection):
@@ -359,34 +479,57 @@ class Listener(threading.Thread):
 
     def stop(self):
         self.running = False
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.connect((self.host, self.port))
-#        client_socket.send("QUITTING")
-        client_socket.close()
 
-    def run(self):
+    def _listen(self):
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Lets several listeners share the port, the kernel then spreads the incoming
+        # connections between them
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         server_socket.bind((self.host, self.port))
         server_socket.listen(5)
+        server_socket.setblocking(False)
+        return server_socket
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        server_socket = self._listen()
+        selector.register(server_socket, selectors.EVENT_READ)
+        # Only accept 510 bytes as irc module appends b'\r\n' to bring
+        # us to max of 512
+        buffer = memoryview(bytearray(510))
         self.logger.info(
             "-> Listener waiting for connection on port {}".format(self.port)
         )
         while self.running:
             if self.restart:
-                server_socket.send("RESTARTING")
+                self.logger.info("-> Restarting Listener")
+                selector.unregister(server_socket)
                 server_socket.close()
-                server_socket = socket.socket(
-                    socket.AF_INET,
-                    socket.SOCK_STREAM
-                )
-                server_socket.bind((self.host, self.port))
-                server_socket.listen(5)
-            client_socket, address = server_socket.accept()
-            # Only accept 510 bytes as irc module appends b'\r\n' to bring
-            # us to max of 512
-            data = client_socket.recv(510).decode('utf-8', errors='replace').strip()
+                server_socket = self._listen()
+                selector.register(server_socket, selectors.EVENT_READ)
+                self.restart = False
+            # Wake up periodically so that stop() and restart are noticed
+            if not selector.select(timeout=1.0):
+                continue
+            try:
+                client_socket, address = server_socket.accept()
+            except BlockingIOError:
+                continue
+            # A client that connects but never sends must not block the thread
+            client_socket.settimeout(2.0)
+            try:
+                size = client_socket.recv_into(buffer)
+            except OSError as e:
+                self.logger.warning("-> Skipping connection from {}: {}".format(
+                    address[0], e
+                ))
+                continue
+            finally:
+                client_socket.close()
+            data = str(buffer[:size], 'utf-8', 'replace').strip()
             self.logger.info("-> Listener Recieved: {}".format(data))
-            client_socket.close()
             try:
                 data_details = data.split()
                 if len(data_details) < 2:
@@ -406,9 +549,44 @@ class Listener(threading.Thread):
                 self.logger.warn(
                     "-> Skipping message as contained newlines: {}".format(data)
                 )
+        selector.close()
         server_socket.close()
 
 
+def batch_join(items, max_length, separator=","):
+    """
+    Join items into as few separator delimited strings as possible, each of which is at
+    most max_length long (unless a single item is already longer than that).
+    """
+    batches = []
+    current = None
+    for item in items:
+        if current is None:
+            current = item
+        elif len(current) + len(separator) + len(item) > max_length:
+            batches.append(current)
+            current = item
+        else:
+            current += separator + item
+    if current is not None:
+        batches.append(current)
+    return batches
+
+
+@functools.lru_cache(maxsize=None)
+def get_ssl_context(verify):
+    """
+    Build the SSL context used to connect to IRC. It is only built once and then shared
+    between connections (and bot restarts). Certificates are not verified unless verify
+    is set (irc.ssl_verify in the config), matching the old ssl.wrap_socket behavior.
+    """
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
 def get_version_string():
     version_string = __version__
     git_hash = get_git_hash()
@@ -490,6 +668,16 @@ def run_hermes():
                     raise SystemExit(
                         "{} already exists, exiting".format(pidfile)
                     )
+                # Give the old instance a moment to exit (and clean up after itself)
+                # before touching the pidfile
+                for _ in range(40):
+                    if not check_pid(old_pid):
+                        break
+                    time.sleep(0.05)
+                else:
+                    raise SystemExit(
+                        "Hermes ({}) has not exited yet".format(old_pid)
+                    )
                 if os.path.isfile(pidfile):
                     os.unlink(pidfile)
                 raise SystemExit(0)
@@ -510,21 +698,26 @@ def run_hermes():
     irc.client.ServerConnection.buffer_class.errors = 'replace'
 
     last_run = None
-    save_thread = None
+    backoff = 2
+    scheduler = None
     try:
         hermes = Hermes()
-        api_poller = PollApi(hermes)
-        api_poller.start()
-        save_thread = SaveData(hermes)
-        save_thread.start()
-        # thread = BotCheck(hermes)
-        # thread.start()
+        # The tasks look up hermes when run, so they follow the bot across restarts
+        scheduler = Scheduler()
+        scheduler.execute_every(
+            hermes.api_poll_heartbeat, lambda: poll_api(hermes), delay=0
+        )
+        scheduler.execute_every(600, lambda: save_data(hermes), delay=120)
+        # scheduler.execute_every(5, lambda: check_channels(hermes), delay=120)
+        scheduler.start()
+
+        stopping = threading.Event()
 
         def signal_handler(sig, _):
-            if sig is signal.SIGTERM:
-                hermes.disconnect()
-            else:
-                hermes.die()
+            # Stop for good instead of reconnecting: die() ends hermes.start() and the
+            # event cuts short any wait between restarts below
+            stopping.set()
+            hermes.die()
 
         signal.signal(signal.SIGTERM, signal_handler)
         # signal.signal(signal.SIGKILL, signal_handler)
@@ -539,22 +732,26 @@ def run_hermes():
                 LOGGER.info("Quitting bot")
                 break
             except RestartException:
-                # thread.stop()
-                time.sleep(5)
+                if stopping.wait(5):
+                    break
                 hermes = Hermes()
-                # thread = BotCheck(hermes)
-                # thread.start()
-                hermes.start()
             except BaseException:
                 if last_run > time.time() - 5:
                     hermes.disconnect("Crashed, going offline.")
                     run_eternal = False
                 else:
+                    # Back off further on each crash, unless the bot had been up for a
+                    # while since the last one
+                    if last_run < time.time() - 300:
+                        backoff = 2
                     hermes.disconnect("Crashed, going to reboot...")
-                    time.sleep(2)
+                    if stopping.wait(backoff):
+                        run_eternal = False
+                    backoff = min(backoff * 2, 60)
                 LOGGER.exception("Crash")
     finally:
-        if save_thread is not None:
-            save_thread.stop()
+        if scheduler is not None:
+            # Don't hold up exiting on a task that is still running
+            scheduler.stop(timeout=1)
         if os.path.isfile(pidfile):
             os.unlink(pidfile)
@@ -5,38 +5,69 @@ in separate files each with its own purpose that we've then registered to be run
 certain command (like getting a privmsg) or matches some regex rule.
 """
 
+import ast
 import importlib.util
 import inspect
 import os
 import re
 import sys
 
+from . import module as decorators
 
-def load_modules():
+_DECORATORS = ('pubmsg', 'privmsg', 'command', 'event', 'rule', 'help_message',
+               'example', 'admin_only', 'disabled')
+
+
+class LazyModule(object):
+    """
+    Placeholder for a module that has been scanned but not imported yet. It has
+    stand-ins for the module's callables so that they can be dispatched to, the bot then
+    swaps in the real module the first time one of them is run.
+    """
+    def __init__(self, name, module_path, callables):
+        self.__name__ = name
+        self.__mod_path__ = module_path
+        self.__callables__ = callables
+
+
+class LazyCallable(object):
+    """Stand-in for a callable of a LazyModule, only has the decorator attributes."""
+    def __init__(self, name):
+        self.__name__ = name
+
+
+def load_modules(lazy=False):
     """
     Loads all the modules from the the modules/ directory within hermes and then checks if
     the ~/hermes/modules folder exists and then loads any modules there as well (if it exists).
     Note, we want all modules to have unique names otherwise any in ~/hermes/modules will overwrite
     any in the modules/ directory.
 
+    :param lazy: if True, modules whose callables can be read from their source are
+                 returned as a LazyModule instead of being imported
     :return: a dictionary containing all loaded modules where they key is module name (filename)
              and the value is the loaded module definition
     """
     modules = {}
     modules_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modules")
-    modules.update(_get_all_modules(modules_dir))
+    modules.update(_get_all_modules(modules_dir, lazy))
     local_dir = os.path.join(os.path.expanduser("~/hermes"), "modules")
     if os.path.isdir(local_dir):
-        modules.update(_get_all_modules(local_dir))
+        modules.update(_get_all_modules(local_dir, lazy))
     return modules
 
 
-def _get_all_modules(directory):
+def _get_all_modules(directory, lazy=False):
     modules = {}
     for path in os.listdir(directory):
         module_path = os.path.join(directory, path)
         if os.path.isfile(module_path) and module_path.endswith(".py"):
-            load_module(modules, module_path)
+            callables = scan_module(module_path) if lazy else None
+            if callables is not None:
+                name = os.path.basename(module_path)[:-3]
+                modules[name] = LazyModule(name, module_path, callables)
+            else:
+                load_module(modules, module_path)
     return modules
 
 
@@ -54,28 +85,101 @@ def load_module(modules, module_path):
 def _parse_callable(obj):
     obj.admin_only = getattr(obj, "admin_only", False) is True
     obj.disabled = getattr(obj, 'disabled', False) is True
-    if not hasattr(obj, 'events'):
-        obj.events = ['pubmsg']
-    else:
-        if isinstance(obj.events, str):
-            obj.events = [obj.events]
-        obj.events = [event.lower() for event in obj.events]
-    if hasattr(obj, 'commands'):
-        if isinstance(obj.commands, str):
-            obj.commands = [obj.commands]
-        obj.commands = [command.lower() for command in obj.commands]
-    if hasattr(obj, 'rules'):
-        if isinstance(obj.rules, str):
-            obj.rules = [[obj.rules, 0]]
-        assert(isinstance(obj.rules, list))
-        for i in range(len(obj.rules)):
-            obj.rules[i] = re.compile(*obj.rules[i])
+    # Normalize commands, rules, and events so that the dispatcher never has to check
+    # which of them a callable actually has.
+    events = getattr(obj, 'events', ['pubmsg'])
+    if isinstance(events, str):
+        events = [events]
+    obj.events = frozenset(event.lower() for event in events)
+    commands = getattr(obj, 'commands', [])
+    if isinstance(commands, str):
+        commands = [commands]
+    obj.commands = tuple(command.lower() for command in commands)
+    rules = getattr(obj, 'rules', [])
+    if isinstance(rules, str):
+        rules = [[rules, 0]]
+    assert(isinstance(rules, (list, tuple)))
+    obj.rules = tuple(rule if isinstance(rule, re.Pattern) else re.compile(*rule)
+                      for rule in rules)
 
     obj.help = getattr(obj, "help", None)
     obj.examples = getattr(obj, "examples", [])
     return obj
 
 
+def _eval_argument(node):
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        return _eval_argument(node.left) | _eval_argument(node.right)
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) \
+            and node.value.id == 're' \
+            and isinstance(getattr(re, node.attr, None), re.RegexFlag):
+        return getattr(re, node.attr)
+    return ast.literal_eval(node)
+
+
+def scan_module(module_path):
+    """
+    Reads the callables of a module from its source without importing it, by applying
+    the decorators from hermes.module found on its top level functions to LazyCallable
+    objects.
+
+    :return: list of LazyCallable, or None if the module does anything the scan cannot
+             follow (non-literal decorator arguments, other decorators, ...) and so has
+             to be imported to find its callables. Modules that define classes are
+             always imported, as instances of them may be pickled in the bot's storage
+             which can only be loaded once the module is in sys.modules.
+    """
+    try:
+        with open(module_path) as f:
+            tree = ast.parse(f.read(), module_path)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    if any(isinstance(node, ast.ClassDef) for node in tree.body):
+        return None
+
+    names = {}
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module == 'hermes.module':
+            for alias in node.names:
+                if alias.name in _DECORATORS:
+                    names[alias.asname or alias.name] = getattr(decorators, alias.name)
+
+    callables = []
+    used = 0
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef) or len(node.decorator_list) == 0:
+            continue
+        func = LazyCallable(node.name)
+        for decorator in reversed(node.decorator_list):
+            if not isinstance(decorator, ast.Call) or decorator.keywords \
+                    or not isinstance(decorator.func, ast.Name) \
+                    or decorator.func.id not in names:
+                return None
+            try:
+                args = [_eval_argument(arg) for arg in decorator.args]
+            except (ValueError, TypeError, SyntaxError):
+                return None
+            func = names[decorator.func.id](*args)(func)
+            used += 1
+        if any(hasattr(func, attr) for attr in ('rules', 'commands')):
+            try:
+                callables.append(_parse_callable(func))
+            except re.error:
+                return None
+
+    # Decorators applied anywhere other than on a top level function would be missed
+    scanned = [decorator for node in tree.body if isinstance(node, ast.FunctionDef)
+               for decorator in node.decorator_list]
+    scanned.extend(node for node in tree.body
+                   if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)))
+    references = sum(1 for root in scanned for node in ast.walk(root)
+                     if isinstance(node, ast.Name) and node.id in names)
+    if len(callables) == 0 or references != used:
+        return None
+    return callables
+
+
 def parse_module(mod):
     callables = []
     for name, func in inspect.getmembers(mod, inspect.isfunction):
@@ -7,7 +7,7 @@ import sys
 
 from hermes.hermes import get_version_string
 from hermes.module import admin_only, privmsg, command
-from hermes.utils import run_popen, file_tail
+from hermes.utils import run_popen, file_tail, get_git_hash
 
 
 @admin_only()
@@ -54,6 +54,7 @@ def update_bot(bot, connection, event):
         if err is not None and str(err, "utf-8") != "":
             bot.logger.error(str(err, "utf-8"))
         os.chdir(current_dir)
+        get_git_hash.cache_clear()
         get_version(bot, connection, event)
         # restart_bot(bot, connection, event)
     else:
@@ -98,6 +99,6 @@ def view_log(bot, connection, event):
 @privmsg()
 @command("resetpolls")
 def reset_polls(bot, connection, event):
-    bot.api_poll_results = []
+    bot.api_poll_results.clear()
     bot.api_poll_messaged = False
     connection.privmsg(event.source.nick, "Reset API polling service.")
@@ -37,9 +37,9 @@ def _show_inner_help(type, bot, connection, event):
             if type in func.events:
                 if func.admin_only is True and not bot.check_admin(event):
                     continue
-                if hasattr(func, "rules"):
+                if func.rules:
                     continue
-                if hasattr(func, "commands"):
+                if func.commands:
                     connection.privmsg(target,
                                        "Command(s): {}".format(", ".join(func.commands)))
                 if func.help is not None:
@@ -41,3 +41,4 @@ def reload_module(bot, connection, event):
         except:
             bot.logger.exception("-> Failed to reload module: {}".format(mod))
             connection.privmsg(event.source.nick, "Failed to reload module: {}".format(mod))
+    bot.build_dispatch_table()
@@ -2,6 +2,7 @@
 Stores data through reboots.
 """
 
+import hashlib
 import pickle
 import os
 import traceback
@@ -11,10 +12,13 @@ from .utils import DotDict
 class PersistentStorage(object):
     def __init__(self, path):
         self.path = path
+        self._saved_digest = None
         if os.path.isfile(path):
             try:
                 with open(path, 'rb') as f:
-                    self.storage = pickle.load(f)
+                    data = f.read()
+                self.storage = pickle.loads(data)
+                self._saved_digest = hashlib.sha1(data).digest()
             except:
                 print(traceback.format_exc())
                 self.storage = DotDict()
@@ -22,12 +26,29 @@ class PersistentStorage(object):
             self.storage = DotDict()
 
     def save(self):
+        """
+        Write the storage out to disk, skipping the write if nothing has changed since
+        the last save. Modules mutate stored values in place, so changes are detected by
+        comparing the serialized data rather than tracking writes. The file is written
+        to a temporary path and synced to disk before being swapped in, so a crash or
+        power loss mid-save cannot truncate it.
+        """
+        tmp_path = self.path + '.tmp'
         try:
-            with open(self.path, 'wb') as f:
-                pickle.dump(self.storage, f)
+            data = pickle.dumps(self.storage, protocol=pickle.HIGHEST_PROTOCOL)
+            digest = hashlib.sha1(data).digest()
+            if digest == self._saved_digest:
+                return
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._saved_digest = digest
         except:
             print(traceback.format_exc())
-            pass
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
 
     def __iter__(self):
         return self.storage.__iter__()
@@ -1,7 +1,14 @@
+import copy
+import functools
 import os
 import subprocess
+from collections import OrderedDict
 
 import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 
 def calculate_size(size):
@@ -39,10 +46,12 @@ def run_popen(command):
     return out, err
 
 
+@functools.lru_cache(maxsize=None)
 def get_git_hash():
     """
     This function attempts to get the hash of the head commit, assuming that hermes is being
-    run out of a git repo, otherwise this will just return None
+    run out of a git repo, otherwise this will just return None. The result is cached as
+    it requires running git, call get_git_hash.cache_clear() if HEAD may have changed.
 
     :return: str hash assuming hermes is in git repo, otherwise None
     """
@@ -78,11 +87,31 @@ def check_pid(pid):
         return True
 
 
+_CONFIG_CACHE = OrderedDict()
+_CONFIG_CACHE_SIZE = 16
+
+
 def load_config(config_file):
-    """Utility function to load the configuration file for Hermes and convert all dictionaries
-    inside the config file to DotDict objects instead"""
-    config = yaml.safe_load(open(config_file))
-    return convert(config)
+    """
+    Utility function to load the configuration file for Hermes and convert all
+    dictionaries inside the config file to DotDict objects instead. Parsed configs are
+    cached per path and only re-read if the file's mtime or size has changed, callers
+    always get their own copy.
+    """
+    stat = os.stat(config_file)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _CONFIG_CACHE.get(config_file)
+    if cached is not None and cached[0] == signature:
+        _CONFIG_CACHE.move_to_end(config_file)
+        return copy.deepcopy(cached[1])
+
+    with open(config_file) as f:
+        config = convert(yaml.load(f, Loader=SafeLoader))
+    _CONFIG_CACHE[config_file] = (signature, config)
+    _CONFIG_CACHE.move_to_end(config_file)
+    while len(_CONFIG_CACHE) > _CONFIG_CACHE_SIZE:
+        _CONFIG_CACHE.popitem(last=False)
+    return copy.deepcopy(config)
 
 
 def convert(node):
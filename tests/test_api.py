@@ -0,0 +1,11 @@
+import requests
+from unittest.mock import patch, MagicMock
+
+from hermes.api import GazelleAPI
+
+
+def test_get_user_timeout():
+    api = GazelleAPI('https://example.test/', 'id', 'key', MagicMock(), timeout=3)
+    with patch('requests.get', side_effect=requests.exceptions.Timeout) as get:
+        assert api.get_user(1) is None
+    assert get.call_args.kwargs['timeout'] == 3
@@ -0,0 +1,194 @@
+import time
+import types
+
+import irc.client
+import pytest
+from unittest.mock import MagicMock
+
+from hermes import Hermes
+from hermes.hermes import Scheduler, batch_join
+from hermes.loader import parse_module, _get_all_modules, LazyModule, LazyCallable
+from hermes.module import event, command, rule, admin_only
+from hermes.utils import convert
+
+
+def make_module(**funcs):
+    mod = types.ModuleType('fake')
+    for name, func in funcs.items():
+        func.__name__ = name
+        setattr(mod, name, func)
+    mod.__callables__ = parse_module(mod)
+    return mod
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def bot(calls):
+    @event('pubmsg', 'privmsg')
+    @command('ping')
+    def ping(bot, connection, evt):
+        calls.append(('ping', evt.args))
+
+    @command('quiet')
+    def quiet(bot, connection, evt):
+        calls.append(('quiet', evt.args))
+
+    @event('pubmsg')
+    @rule(r'https?://(\S+)')
+    def link(bot, connection, evt, match):
+        calls.append(('link', match.group(1)))
+
+    @admin_only()
+    @event('privmsg')
+    @command('secret')
+    def secret(bot, connection, evt):
+        calls.append(('secret', evt.args))
+
+    @event('privmsg')
+    @command('boom')
+    def boom(bot, connection, evt):
+        raise ValueError()
+
+    hermes = Hermes.__new__(Hermes)
+    hermes.logger = MagicMock()
+    hermes.config = convert({'site': {'tld': 'example.test'}, 'admins': ['admin']})
+    hermes._admins = set(hermes.config.admins)
+    hermes.modules = {'fake': make_module(
+        ping=ping, quiet=quiet, link=link, secret=secret, boom=boom
+    )}
+    hermes.build_dispatch_table()
+    return hermes
+
+
+def make_event(msg, type='pubmsg', source='nick!userid@name.User.example.test'):
+    return irc.client.Event(
+        type=type,
+        source=irc.client.NickMask(source),
+        target='#channel',
+        arguments=[msg]
+    )
+
+
+@pytest.mark.parametrize('msg', ['.ping a b', '!ping a b', '.PING a b'])
+def test_dispatch_prefixed_command(bot, calls, msg):
+    bot._dispatch(MagicMock(), make_event(msg))
+    assert calls == [('ping', ['a', 'b'])]
+
+
+def test_dispatch_bare_command_only_privmsg(bot, calls):
+    bot._dispatch(MagicMock(), make_event('ping'))
+    assert calls == []
+    bot._dispatch(MagicMock(), make_event('ping', type='privmsg'))
+    assert calls == [('ping', [])]
+
+
+def test_dispatch_checks_event_type(bot, calls):
+    bot._dispatch(MagicMock(), make_event('.quiet', type='privmsg'))
+    assert calls == []
+    bot._dispatch(MagicMock(), make_event('.quiet'))
+    assert calls == [('quiet', [])]
+
+
+def test_dispatch_rule(bot, calls):
+    bot._dispatch(MagicMock(), make_event('look at https://example.test/a'))
+    assert calls == [('link', 'example.test/a')]
+
+
+def test_dispatch_empty_message(bot, calls):
+    bot._dispatch(MagicMock(), make_event('   '))
+    assert calls == []
+
+
+def test_dispatch_admin_only(bot, calls):
+    bot._dispatch(MagicMock(), make_event('.secret x', type='privmsg'))
+    assert calls == []
+    admin = 'admin!userid@sysop.example.test'
+    bot._dispatch(MagicMock(), make_event('.secret x', type='privmsg', source=admin))
+    assert calls == [('secret', ['x'])]
+
+
+def test_dispatch_exception(bot, calls):
+    connection = MagicMock()
+    bot._dispatch(connection, make_event('.boom', type='privmsg'))
+    connection.privmsg.assert_called_once()
+    assert connection.privmsg.call_args.args[0] == 'nick'
+    bot.logger.exception.assert_called_once()
+
+
+def test_check_admin_cached(bot):
+    evt = make_event('.secret', source='admin!userid@sysop.example.test')
+    assert bot.check_admin(evt) is True
+    bot._admins = set()
+    assert bot.check_admin(evt) is True
+    evt = make_event('.secret', source='admin!userid@sysop.example.test')
+    assert bot.check_admin(evt) is False
+
+
+def test_dispatch_lazy_module(tmp_path, calls):
+    (tmp_path / 'lazy_fake.py').write_text("""
+from hermes.module import event, command
+
+
+def setup(bot):
+    bot.calls.append(('setup', None))
+
+
+@event('pubmsg')
+@command('lazy')
+def lazy(bot, connection, event):
+    bot.calls.append(('lazy', event.args))
+""")
+    hermes = Hermes.__new__(Hermes)
+    hermes.logger = MagicMock()
+    hermes.calls = calls
+    hermes.modules = _get_all_modules(str(tmp_path), lazy=True)
+    assert isinstance(hermes.modules['lazy_fake'], LazyModule)
+    hermes.build_dispatch_table()
+    assert isinstance(hermes._cmd_table['lazy'][0][1], LazyCallable)
+
+    hermes._dispatch(MagicMock(), make_event('.lazy a'))
+    hermes._dispatch(MagicMock(), make_event('.lazy b'))
+    assert calls == [('setup', None), ('lazy', ['a']), ('lazy', ['b'])]
+    assert not isinstance(hermes.modules['lazy_fake'], LazyModule)
+    assert not isinstance(hermes._cmd_table['lazy'][0][1], LazyCallable)
+
+
+def test_scheduler():
+    calls = []
+    scheduler = Scheduler()
+    scheduler.execute_every(0.05, lambda: calls.append('fast'), delay=0)
+    scheduler.execute_every(60, lambda: calls.append('slow'))
+    scheduler.start()
+    time.sleep(0.2)
+    scheduler.stop()
+    assert not scheduler.is_alive()
+    assert 2 <= calls.count('fast') <= 5
+    assert 'slow' not in calls
+
+
+def test_scheduler_survives_exception():
+    calls = []
+
+    def fail():
+        calls.append('fail')
+        raise ValueError()
+
+    scheduler = Scheduler()
+    scheduler.logger = MagicMock()
+    scheduler.execute_every(0.05, fail, delay=0)
+    scheduler.start()
+    time.sleep(0.12)
+    scheduler.stop()
+    assert len(calls) >= 2
+    scheduler.logger.exception.assert_called()
+
+
+def test_batch_join():
+    assert batch_join([], 10) == []
+    assert batch_join(['#a', '#b', '#c'], 10) == ['#a,#b,#c']
+    assert batch_join(['#aaaa', '#bbbb', '#c'], 10) == ['#aaaa', '#bbbb,#c']
+    assert batch_join(['#toolongname', '#a'], 10) == ['#toolongname', '#a']
@@ -0,0 +1,104 @@
+import socket
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from hermes.hermes import Listener
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def connect(port):
+    for _ in range(50):
+        try:
+            return socket.create_connection(('127.0.0.1', port))
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+
+def send(port, data):
+    client = connect(port)
+    client.sendall(data)
+    client.close()
+
+
+def wait_for(mock):
+    for _ in range(50):
+        if mock.called:
+            return
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def listener():
+    listener = Listener('127.0.0.1', free_port())
+    listener.set_connection(MagicMock())
+    listener.start()
+    yield listener
+    listener.stop()
+    listener.join(5)
+    assert not listener.is_alive()
+
+
+def test_listener_relays(listener):
+    send(listener.port, b'privmsg #announce hello world\r\n')
+    wait_for(listener.connection.send_raw)
+    listener.connection.send_raw.assert_called_once_with(
+        'privmsg #announce hello world'
+    )
+
+
+def test_listener_skips_short(listener):
+    send(listener.port, b'privmsg')
+    send(listener.port, b'privmsg #announce hello')
+    wait_for(listener.connection.send_raw)
+    listener.connection.send_raw.assert_called_once_with('privmsg #announce hello')
+
+
+def test_listener_restart(listener):
+    listener.restart = True
+    send(listener.port, b'privmsg #announce hello')
+    wait_for(listener.connection.send_raw)
+    listener.connection.send_raw.assert_called_once_with('privmsg #announce hello')
+    assert listener.restart is False
+
+
+def test_listener_skips_idle_client(listener):
+    idle = connect(listener.port)
+    try:
+        send(listener.port, b'privmsg #announce hello')
+        for _ in range(100):
+            if listener.connection.send_raw.called:
+                break
+            time.sleep(0.05)
+        listener.connection.send_raw.assert_called_once_with('privmsg #announce hello')
+        assert listener.is_alive()
+    finally:
+        idle.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'),
+                    reason='platform has no SO_REUSEPORT')
+def test_listener_reuse_port():
+    port = free_port()
+    server_socket = Listener('127.0.0.1', port)._listen()
+    try:
+        assert server_socket.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT) == 0
+    finally:
+        server_socket.close()
+
+    listeners = [Listener('127.0.0.1', port, reuse_port=True) for _ in range(2)]
+    sockets = [listener._listen() for listener in listeners]
+    try:
+        for server_socket in sockets:
+            assert server_socket.getsockopt(
+                socket.SOL_SOCKET, socket.SO_REUSEPORT
+            ) != 0
+    finally:
+        for server_socket in sockets:
+            server_socket.close()
@@ -0,0 +1,84 @@
+import re
+
+from hermes.loader import load_modules, scan_module, LazyCallable
+
+
+def write_module(tmp_path, source):
+    path = tmp_path / 'scanned.py'
+    path.write_text(source)
+    return str(path)
+
+
+def test_scan_module(tmp_path):
+    path = write_module(tmp_path, """
+import re
+from hermes.module import event, command, rule, admin_only
+
+
+def setup(bot):
+    pass
+
+
+@admin_only()
+@event('privmsg')
+@command('Foo', 'bar')
+def foo(bot, connection, event):
+    pass
+
+
+@rule(r'^baz', re.I | re.M)
+def baz(bot, connection, event, match):
+    pass
+
+
+def helper():
+    pass
+""")
+    callables = {func.__name__: func for func in scan_module(path)}
+    assert set(callables) == {'foo', 'baz'}
+    assert isinstance(callables['foo'], LazyCallable)
+    assert callables['foo'].commands == ('foo', 'bar')
+    assert callables['foo'].events == frozenset(['privmsg'])
+    assert callables['foo'].admin_only is True
+    assert callables['baz'].events == frozenset(['pubmsg'])
+    assert callables['baz'].rules == (re.compile(r'^baz', re.I | re.M),)
+
+
+def test_scan_module_non_literal(tmp_path):
+    path = write_module(tmp_path, """
+from hermes.module import command
+NAME = 'foo'
+
+
+@command(NAME)
+def foo(bot, connection, event):
+    pass
+""")
+    assert scan_module(path) is None
+
+
+def test_scan_module_applied_elsewhere(tmp_path):
+    path = write_module(tmp_path, """
+from hermes.module import command
+
+
+@command('foo')
+def foo(bot, connection, event):
+    pass
+
+
+bar = command('bar')(foo)
+""")
+    assert scan_module(path) is None
+
+
+def test_lazy_modules_match_loaded():
+    lazy = load_modules(lazy=True)
+    loaded = load_modules()
+    assert set(lazy) == set(loaded)
+    for name, mod in lazy.items():
+        funcs = {func.__name__: func for func in loaded[name].__callables__}
+        for func in mod.__callables__:
+            for attr in ('commands', 'rules', 'events', 'admin_only', 'disabled',
+                         'help', 'examples'):
+                assert getattr(func, attr) == getattr(funcs[func.__name__], attr)
@@ -0,0 +1,64 @@
+import os
+import sys
+from unittest.mock import patch
+
+from hermes.loader import load_modules, LazyModule
+from hermes.persist import PersistentStorage
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'persist.dat')
+    storage = PersistentStorage(path)
+    storage['quotes'] = {'a': 'b'}
+    storage.save()
+    assert PersistentStorage(path)['quotes'] == {'a': 'b'}
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_save_skips_unchanged(tmp_path):
+    path = str(tmp_path / 'persist.dat')
+    storage = PersistentStorage(path)
+    storage['queue'] = []
+    storage.save()
+    inode = os.stat(path).st_ino
+    storage.save()
+    assert os.stat(path).st_ino == inode
+
+
+def test_save_detects_in_place_changes(tmp_path):
+    path = str(tmp_path / 'persist.dat')
+    storage = PersistentStorage(path)
+    storage['queue'] = []
+    storage.save()
+    storage['queue'].append('user')
+    storage.save()
+    assert PersistentStorage(path)['queue'] == ['user']
+
+
+def test_save_failure_keeps_file(tmp_path):
+    path = str(tmp_path / 'persist.dat')
+    storage = PersistentStorage(path)
+    storage['queue'] = []
+    storage.save()
+    storage['queue'].append('user')
+    with patch('os.replace', side_effect=OSError()):
+        storage.save()
+    assert not os.path.exists(path + '.tmp')
+    assert PersistentStorage(path)['queue'] == []
+    storage.save()
+    assert PersistentStorage(path)['queue'] == ['user']
+
+
+def test_load_with_lazy_modules(tmp_path, monkeypatch):
+    path = str(tmp_path / 'persist.dat')
+    interview = load_modules()['interview']
+    storage = PersistentStorage(path)
+    storage['interview_queue'] = [interview.UserClass('nick', 'host', 'user', None)]
+    storage.save()
+
+    monkeypatch.delitem(sys.modules, 'interview')
+    modules = load_modules(lazy=True)
+    assert not isinstance(modules['interview'], LazyModule)
+    queue = PersistentStorage(path)['interview_queue']
+    assert len(queue) == 1
+    assert queue[0].nick == 'nick'
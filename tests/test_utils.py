@@ -0,0 +1,35 @@
+import os
+
+from hermes.utils import load_config, DotDict
+
+
+def write_config(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_load_config_converts(tmp_path):
+    config_file = str(tmp_path / 'config.yml')
+    write_config(config_file, 'nick: hermes\nirc:\n  host: 127.0.0.1\n')
+    config = load_config(config_file)
+    assert isinstance(config, DotDict)
+    assert config.nick == 'hermes'
+    assert config.irc.host == '127.0.0.1'
+
+
+def test_load_config_returns_copy(tmp_path):
+    config_file = str(tmp_path / 'config.yml')
+    write_config(config_file, 'nick: hermes\nirc:\n  host: 127.0.0.1\n')
+    config = load_config(config_file)
+    config.irc.host = 'example.test'
+    assert load_config(config_file).irc.host == '127.0.0.1'
+
+
+def test_load_config_reloads_on_change(tmp_path):
+    config_file = str(tmp_path / 'config.yml')
+    write_config(config_file, 'nick: hermes\n')
+    assert load_config(config_file).nick == 'hermes'
+    write_config(config_file, 'nick: orpheus\n')
+    stat = os.stat(config_file)
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert load_config(config_file).nick == 'orpheus'